@@ -2,40 +2,63 @@
 Compare code execution ON vs OFF results and generate report.
 """
 
+import io
 import json
 import re
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson  # faster C parser; json.loads also accepts bytes
+except ImportError:
+    orjson = None
+
 OUTPUTS_DIR = Path(__file__).parent.parent / "outputs"
 RAW_DIR = OUTPUTS_DIR / "raw"
 
+# Look for patterns like "5 fingers", "there are 8", "count: 15"
+_NUM_PATTERNS = tuple(re.compile(p) for p in [
+    r"(\d+)\s*fingers?",
+    r"(\d+)\s*coins?",
+    r"(\d+)\s*rebar",
+    r"(\d+)\s*pieces?",
+    r"(\d+)\s*items?",
+    r"count[:\s]+(\d+)",
+    r"total[:\s]+(\d+)",
+    r"there (?:are|is) (\d+)",
+    r"^(\d+)$",  # Just a number
+])
+
+# Flattens response previews onto a single report line
+_NEWLINES_TO_SPACES = str.maketrans({"\n": " ", "\r": " "})
+
 
 def find_latest_results() -> Path:
-    """Find the most recent results file."""
-    results_files = list(RAW_DIR.glob("experiment_results_*.json"))
+    """Find the most recent results file (JSON Lines, or a legacy JSON array)."""
+    results_files = list(RAW_DIR.glob("experiment_results_*.jsonl"))
+    results_files += RAW_DIR.glob("experiment_results_*.json")
     if not results_files:
         raise FileNotFoundError("No results files found in outputs/raw/")
-    return max(results_files, key=lambda p: p.stat().st_mtime)
+    # Names embed a %Y%m%d_%H%M%S timestamp, which sorts lexicographically
+    return max(results_files, key=lambda p: p.name)
+
+
+def load_results(results_file: Path) -> list:
+    """Load test results, one per line for .jsonl files."""
+    loads = (orjson or json).loads
+    if results_file.suffix == ".jsonl":
+        with open(results_file, "rb") as f:
+            return [loads(line) for line in f if line.strip()]
+    return loads(results_file.read_bytes())
 
 
+@lru_cache(maxsize=4096)
 def extract_number(text: str) -> int | None:
     """Try to extract a number from response text."""
-    # Look for patterns like "5 fingers", "there are 8", "count: 15"
-    patterns = [
-        r"(\d+)\s*fingers?",
-        r"(\d+)\s*coins?",
-        r"(\d+)\s*rebar",
-        r"(\d+)\s*pieces?",
-        r"(\d+)\s*items?",
-        r"count[:\s]+(\d+)",
-        r"total[:\s]+(\d+)",
-        r"there (?:are|is) (\d+)",
-        r"^(\d+)$",  # Just a number
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, text.lower())
+    text_lower = text.lower()
+    for pattern in _NUM_PATTERNS:
+        match = pattern.search(text_lower)
         if match:
             return int(match.group(1))
     return None
@@ -65,22 +88,24 @@ def analyze_results(results: list) -> dict:
         off_correct = 0
         total_with_gt = 0
 
-        for i, (on_result, off_result) in enumerate(zip(code_on, code_off)):
+        for on_result, off_result in zip(code_on, code_off):
             gt = on_result.get("ground_truth")
-            if gt is not None:
-                total_with_gt += 1
-
-                on_extracted = extract_number(on_result.get("response_text", ""))
-                off_extracted = extract_number(off_result.get("response_text", ""))
-
-                if on_extracted == gt:
-                    on_correct += 1
-                if off_extracted == gt:
-                    off_correct += 1
-
-        # Code execution stats
-        on_used_code = sum(1 for r in code_on if r.get("code_executed"))
-        on_generated_images = sum(r.get("images_generated", 0) for r in code_on)
+            if gt is None:
+                continue
+            total_with_gt += 1
+
+            if extract_number(on_result.get("response_text", "")) == gt:
+                on_correct += 1
+            if extract_number(off_result.get("response_text", "")) == gt:
+                off_correct += 1
+
+        # Code execution stats (one pass; code_on may be longer than code_off)
+        on_used_code = 0
+        on_generated_images = 0
+        for r in code_on:
+            if r.get("code_executed"):
+                on_used_code += 1
+            on_generated_images += r.get("images_generated", 0)
 
         comparison[test_name] = {
             "total_images": len(code_on),
@@ -96,56 +121,57 @@ def analyze_results(results: list) -> dict:
 
 def generate_report(results: list, comparison: dict) -> str:
     """Generate markdown comparison report."""
-    report = []
-    report.append("# Experiment Results: Gemini 3 Flash Agentic Vision")
-    report.append(f"\n**Generated**: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-    report.append("\n## Summary\n")
+    buf = io.StringIO()
+    w = buf.write
+    w("# Experiment Results: Gemini 3 Flash Agentic Vision\n")
+    w(f"\n**Generated**: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n")
+    w("\n## Summary\n\n")
 
     # Summary table
-    report.append("| Test | Code OFF Accuracy | Code ON Accuracy | Code Blocks Used | Images Annotated |")
-    report.append("|------|-------------------|------------------|------------------|------------------|")
+    w("| Test | Code OFF Accuracy | Code ON Accuracy | Code Blocks Used | Images Annotated |\n")
+    w("|------|-------------------|------------------|------------------|------------------|\n")
 
     for test_name, stats in comparison.items():
         off_acc = f"{stats['code_off_accuracy']:.0%}" if stats['code_off_accuracy'] is not None else "N/A"
         on_acc = f"{stats['code_on_accuracy']:.0%}" if stats['code_on_accuracy'] is not None else "N/A"
-        report.append(f"| {test_name} | {off_acc} | {on_acc} | {stats['code_blocks_executed']} | {stats['images_annotated']} |")
+        w(f"| {test_name} | {off_acc} | {on_acc} | {stats['code_blocks_executed']} | {stats['images_annotated']} |\n")
 
     # Detailed results
-    report.append("\n## Detailed Results\n")
+    w("\n## Detailed Results\n\n")
 
     for result in results:
         mode = "Code Execution ON" if result["code_execution"] else "Code Execution OFF"
-        report.append(f"### {result['test_name']} ({mode})\n")
+        w(f"### {result['test_name']} ({mode})\n\n")
 
         for r in result["results"]:
             status_icon = "✓" if r["status"] == "success" else "⚠" if r["status"] == "skipped" else "✗"
-            report.append(f"**{r['image']}** {status_icon}")
+            w(f"**{r['image']}** {status_icon}\n")
 
             if r.get("ground_truth"):
                 extracted = extract_number(r.get("response_text", ""))
                 correct = "✓" if extracted == r["ground_truth"] else "✗"
-                report.append(f"  - Ground truth: {r['ground_truth']}, Extracted: {extracted} {correct}")
+                w(f"  - Ground truth: {r['ground_truth']}, Extracted: {extracted} {correct}\n")
 
             if r.get("response_text"):
-                preview = r["response_text"][:200].replace("\n", " ")
-                report.append(f"  - Response: {preview}...")
+                preview = r["response_text"][:200].translate(_NEWLINES_TO_SPACES)
+                w(f"  - Response: {preview}...\n")
 
             if r.get("code_executed"):
-                report.append(f"  - Code executed: {len(r['code_executed'])} blocks")
+                w(f"  - Code executed: {len(r['code_executed'])} blocks\n")
 
             if r.get("images_generated"):
-                report.append(f"  - Annotated images generated: {r['images_generated']}")
+                w(f"  - Annotated images generated: {r['images_generated']}\n")
 
-            report.append("")
+            w("\n")
 
     # Key findings
-    report.append("\n## Key Findings\n")
-    report.append("*To be filled in after reviewing results*\n")
-    report.append("1. **[Most surprising result]**: ...\n")
-    report.append("2. **[Hypothesis confirmed/refuted]**: ...\n")
-    report.append("3. **[Unexpected behavior]**: ...\n")
+    w("\n## Key Findings\n\n")
+    w("*To be filled in after reviewing results*\n\n")
+    w("1. **[Most surprising result]**: ...\n")
+    w("2. **[Hypothesis confirmed/refuted]**: ...\n")
+    w("3. **[Unexpected behavior]**: ...\n")
 
-    return "\n".join(report)
+    return buf.getvalue()
 
 
 def main():
@@ -155,8 +181,7 @@ def main():
     results_file = find_latest_results()
     print(f"Loading: {results_file.name}")
 
-    with open(results_file) as f:
-        results = json.load(f)
+    results = load_results(results_file)
 
     # Analyze
     comparison = analyze_results(results)
@@ -166,8 +191,7 @@ def main():
 
     # Save report
     report_path = OUTPUTS_DIR / "comparison.md"
-    with open(report_path, "w") as f:
-        f.write(report)
+    report_path.write_bytes(report.encode("utf-8"))
 
     print(f"\nReport saved to: {report_path}")
     print("\n" + "="*50)
@@ -5,11 +5,17 @@ Uses Unsplash API for free stock photos.
 
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 
 INPUTS_DIR = Path(__file__).parent.parent / "inputs"
 INPUTS_DIR.mkdir(exist_ok=True)
 
+# Shared session so downloads reuse pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
 # Unsplash direct URLs (no API key needed for direct links)
 # These are sample images - replace with specific ones as needed
 SAMPLE_IMAGES = {
@@ -37,17 +43,19 @@ def download_image(url: str, filename: str) -> bool:
 
     try:
         print(f"  Downloading {filename}...")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-
-        with open(filepath, "wb") as f:
-            f.write(response.content)
-
-        print(f"  ✓ Saved {filename} ({len(response.content) / 1024:.1f} KB)")
+        # Stream to disk in chunks rather than buffering the whole body
+        with _SESSION.get(url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            with open(filepath, "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+
+        print(f"  ✓ Saved {filename} ({filepath.stat().st_size / 1024:.1f} KB)")
         return True
 
     except Exception as e:
         print(f"  ✗ Failed to download {filename}: {e}")
+        filepath.unlink(missing_ok=True)  # Don't leave a partial file behind
         return False
 
 
@@ -88,10 +96,8 @@ def create_placeholder_list():
 def main():
     print("Downloading sample images for experiment...\n")
 
-    success_count = 0
-    for filename, url in SAMPLE_IMAGES.items():
-        if download_image(url, filename):
-            success_count += 1
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        success_count = sum(executor.map(download_image, SAMPLE_IMAGES.values(), SAMPLE_IMAGES.keys()))
 
     print(f"\nDownloaded {success_count}/{len(SAMPLE_IMAGES)} images")
 
@@ -4,45 +4,80 @@ Gemini 3 Flash API client with code execution toggle.
 
 import os
 import json
-import base64
+import threading
+import uuid
+from functools import cache, lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 
-# Load environment
-load_dotenv(Path(__file__).parent.parent / ".env")
-
-# Initialize client
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 MODEL = "gemini-3-flash-preview"
 
+SCREENSHOTS_DIR = Path(__file__).parent.parent / "outputs" / "screenshots"
+
+_MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+
+
+_client_lock = threading.Lock()
+
+
+def get_client() -> genai.Client:
+    """Return the process-wide Gemini client, creating it on first use."""
+    # Queries run on worker threads; the lock keeps the first calls from racing
+    with _client_lock:
+        return _create_client()
+
+
+@cache
+def _create_client() -> genai.Client:
+    load_dotenv(Path(__file__).parent.parent / ".env")
+    return genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 
-def load_image(image_path: str) -> types.Part:
+
+def list_input_files(inputs_dir: str | os.PathLike) -> set[str]:
+    """Names of the files in inputs_dir, listed once so each image needn't be stat'ed."""
+    if not os.path.isdir(inputs_dir):
+        return set()
+    with os.scandir(inputs_dir) as entries:
+        return {entry.name for entry in entries if entry.is_file()}
+
+
+def load_image(image_path: str | os.PathLike) -> types.Part:
     """Load an image file and return as Gemini Part."""
     path = Path(image_path)
-    with open(path, "rb") as f:
-        image_data = f.read()
-
-    # Determine mime type
-    suffix = path.suffix.lower()
-    mime_types = {
-        ".jpg": "image/jpeg",
-        ".jpeg": "image/jpeg",
-        ".png": "image/png",
-        ".gif": "image/gif",
-        ".webp": "image/webp",
-    }
-    mime_type = mime_types.get(suffix, "image/jpeg")
+    return _load_part(str(path), path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=64)
+def _load_part(path_str: str, mtime_ns: int) -> types.Part:
+    """Read and wrap an image once per (path, mtime); each image is queried in both modes."""
+    path = Path(path_str)
+    image_data = path.read_bytes()
+    mime_type = _MIME_TYPES.get(path.suffix.lower(), "image/jpeg")
 
     return types.Part.from_bytes(data=image_data, mime_type=mime_type)
 
 
+def save_inline_image(data: bytes) -> Path:
+    """Write generated image bytes to the screenshots folder under a unique name."""
+    SCREENSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+    img_path = SCREENSHOTS_DIR / f"{uuid.uuid4().hex}.png"
+    img_path.write_bytes(data)
+    return img_path
+
+
 def run_vision_query(
-    image_path: str,
+    image_path: str | os.PathLike,
     prompt: str,
     code_execution: bool = False,
-    thinking_level: str = "medium"
+    thinking_level: str | None = "medium"
 ) -> dict:
     """
     Run a vision query with optional code execution.
@@ -51,7 +86,7 @@ def run_vision_query(
         image_path: Path to the image file
         prompt: The question/instruction for the model
         code_execution: Whether to enable code execution tools
-        thinking_level: "low", "medium", or "high"
+        thinking_level: "low", "medium", "high", or None for the model default
 
     Returns:
         dict with response text, any code executed, and metadata
@@ -64,13 +99,17 @@ def run_vision_query(
         tools = [types.Tool(code_execution=types.ToolCodeExecution())]
 
     # Build config
+    thinking_config = None
+    if thinking_level is not None:
+        thinking_config = types.ThinkingConfig(thinking_level=thinking_level)
+
     config = types.GenerateContentConfig(
         tools=tools,
-        thinking_config=types.ThinkingConfig(thinking_level=thinking_level)
+        thinking_config=thinking_config,
     )
 
     try:
-        response = client.models.generate_content(
+        response = get_client().models.generate_content(
             model=MODEL,
             contents=[image, prompt],
             config=config,
@@ -83,24 +122,25 @@ def run_vision_query(
             "code_executed": [],
             "code_results": [],
             "images_generated": [],
-            "raw_parts": [],
         }
 
         # Extract parts from response
+        texts = []
         for candidate in response.candidates:
             for part in candidate.content.parts:
-                if hasattr(part, "text") and part.text:
-                    result["text"] += part.text
-                if hasattr(part, "executable_code") and part.executable_code:
-                    result["code_executed"].append(part.executable_code.code)
-                if hasattr(part, "code_execution_result") and part.code_execution_result:
-                    result["code_results"].append(part.code_execution_result.output)
-                if hasattr(part, "inline_data") and part.inline_data:
+                # A Part carries a single payload, so stop at the first one set
+                if text := getattr(part, "text", None):
+                    texts.append(text)
+                elif code := getattr(part, "executable_code", None):
+                    result["code_executed"].append(code.code)
+                elif code_result := getattr(part, "code_execution_result", None):
+                    result["code_results"].append(code_result.output)
+                elif inline_data := getattr(part, "inline_data", None):
                     result["images_generated"].append({
-                        "mime_type": part.inline_data.mime_type,
-                        "data": base64.b64encode(part.inline_data.data).decode()
+                        "mime_type": inline_data.mime_type,
+                        "path": str(save_inline_image(inline_data.data)),
                     })
-                result["raw_parts"].append(str(part)[:500])  # Truncate for logging
+        result["text"] = "".join(texts)
 
         return result
 
@@ -118,7 +158,7 @@ def run_vision_query(
 def test_connection() -> bool:
     """Test API connection with a simple text query."""
     try:
-        response = client.models.generate_content(
+        response = get_client().models.generate_content(
             model=MODEL,
             contents="Say 'API connection successful' and nothing else.",
         )
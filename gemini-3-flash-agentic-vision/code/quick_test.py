@@ -3,15 +3,19 @@ Quick experiment runner - downloads images and runs focused tests.
 Tests the core claim: does code execution improve counting accuracy?
 """
 
-import os
 import json
-import base64
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 from datetime import datetime
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
+
+from gemini_client import MODEL, run_vision_query
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Setup paths
 EXPERIMENT_DIR = Path(__file__).parent.parent
@@ -25,12 +29,12 @@ INPUTS_DIR.mkdir(exist_ok=True)
 RAW_DIR.mkdir(parents=True, exist_ok=True)
 SCREENSHOTS_DIR.mkdir(parents=True, exist_ok=True)
 
-# Load environment
-load_dotenv(EXPERIMENT_DIR / ".env")
+# Shared session so image downloads reuse pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
 
-# Initialize Gemini client
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
-MODEL = "gemini-3-flash-preview"
+# Concurrent API requests; kept low to stay under Gemini rate limits
+MAX_WORKERS = 4
 
 # Test images - using Unsplash direct URLs (publicly available)
 TEST_IMAGES = {
@@ -80,110 +84,50 @@ def download_image(name: str, url: str) -> Path:
 
     try:
         print(f"  Downloading {name}...")
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-
-        with open(filepath, "wb") as f:
-            f.write(response.content)
-
-        print(f"  ✓ Saved {name}.jpg ({len(response.content) / 1024:.1f} KB)")
+        # Stream to disk in chunks rather than buffering the whole body
+        with _SESSION.get(url, timeout=30, stream=True) as response:
+            response.raise_for_status()
+            with open(filepath, "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+
+        print(f"  ✓ Saved {name}.jpg ({filepath.stat().st_size / 1024:.1f} KB)")
         return filepath
 
     except Exception as e:
         print(f"  ✗ Failed: {e}")
+        filepath.unlink(missing_ok=True)  # Don't leave a partial file behind
         return None
 
 
-def load_image_as_part(image_path: Path) -> types.Part:
-    """Load image file as Gemini Part."""
-    with open(image_path, "rb") as f:
-        image_data = f.read()
-    return types.Part.from_bytes(data=image_data, mime_type="image/jpeg")
-
-
-def run_vision_query(image_path: Path, prompt: str, code_execution: bool) -> dict:
-    """Run a vision query with optional code execution."""
-    image = load_image_as_part(image_path)
-
-    # Configure tools
-    tools = []
-    if code_execution:
-        tools = [types.Tool(code_execution=types.ToolCodeExecution())]
-
-    config = types.GenerateContentConfig(
-        tools=tools,
-    )
-
-    try:
-        response = client.models.generate_content(
-            model=MODEL,
-            contents=[image, prompt],
-            config=config,
-        )
-
-        result = {
-            "success": True,
-            "text": "",
-            "code_executed": [],
-            "code_results": [],
-            "images_generated": [],
-        }
-
-        # Parse response parts
-        for candidate in response.candidates:
-            for part in candidate.content.parts:
-                if hasattr(part, "text") and part.text:
-                    result["text"] += part.text
-                if hasattr(part, "executable_code") and part.executable_code:
-                    result["code_executed"].append(part.executable_code.code)
-                if hasattr(part, "code_execution_result") and part.code_execution_result:
-                    result["code_results"].append(part.code_execution_result.output)
-                if hasattr(part, "inline_data") and part.inline_data:
-                    result["images_generated"].append({
-                        "mime_type": part.inline_data.mime_type,
-                        "data": base64.b64encode(part.inline_data.data).decode()
-                    })
-
-        return result
-
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "text": "",
-            "code_executed": [],
-            "code_results": [],
-            "images_generated": [],
-        }
-
-
 def run_test(name: str, image_path: Path, prompt: str, code_execution: bool) -> dict:
     """Run a single test and return results."""
     mode = "code_ON" if code_execution else "code_OFF"
-    print(f"\n  [{mode}] Testing {name}...")
 
-    result = run_vision_query(image_path, prompt, code_execution)
+    # No thinking_level: this experiment runs with the model's default thinking
+    result = run_vision_query(image_path, prompt, code_execution, thinking_level=None)
 
+    # Tests run concurrently, so print each test's output as one block
+    lines = [f"\n  [{mode}] {name}"]
     if result["success"]:
         # Show preview
         text_preview = result["text"][:150].replace("\n", " ")
-        print(f"    Response: {text_preview}...")
+        lines.append(f"    Response: {text_preview}...")
 
         if result["code_executed"]:
-            print(f"    ✓ Code executed: {len(result['code_executed'])} block(s)")
+            lines.append(f"    ✓ Code executed: {len(result['code_executed'])} block(s)")
 
         if result["images_generated"]:
-            print(f"    ✓ Annotated image generated")
-            # Save the image
+            lines.append(f"    ✓ Annotated image generated")
+            # Give the saved image a descriptive name
             for i, img in enumerate(result["images_generated"]):
-                img_bytes = base64.b64decode(img["data"])
-                img_path = SCREENSHOTS_DIR / f"{name}_{mode}_{i}.png"
-                with open(img_path, "wb") as f:
-                    f.write(img_bytes)
-                print(f"    ✓ Saved: {img_path.name}")
+                img_path = Path(img["path"]).replace(SCREENSHOTS_DIR / f"{name}_{mode}_{i}.png")
+                img["path"] = str(img_path)
+                lines.append(f"    ✓ Saved: {img_path.name}")
     else:
-        print(f"    ✗ Error: {result.get('error', 'Unknown')}")
+        lines.append(f"    ✗ Error: {result.get('error', 'Unknown')}")
 
+    print("\n".join(lines))
     return result
 
 
@@ -216,29 +160,29 @@ def main():
     print("STEP 2: Running experiments")
     print("=" * 60)
 
-    all_results = []
-
-    for name, path in image_paths.items():
-        info = TEST_IMAGES[name]
-        print(f"\n{'='*40}")
-        print(f"Test: {name} ({info['category']})")
-        print(f"Description: {info['description']}")
-        print(f"{'='*40}")
-
-        # Run with code execution OFF
-        result_off = run_test(name, path, info["prompt"], code_execution=False)
+    # Every (image, mode) pair is an independent API call, so run them concurrently
+    print(f"Running {len(image_paths)} tests (code OFF and ON), {MAX_WORKERS} requests at a time...")
 
-        # Run with code execution ON
-        result_on = run_test(name, path, info["prompt"], code_execution=True)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            name: (
+                executor.submit(run_test, name, path, TEST_IMAGES[name]["prompt"], False),
+                executor.submit(run_test, name, path, TEST_IMAGES[name]["prompt"], True),
+            )
+            for name, path in image_paths.items()
+        }
 
-        all_results.append({
-            "name": name,
-            "category": info["category"],
-            "description": info["description"],
-            "prompt": info["prompt"],
-            "code_off": result_off,
-            "code_on": result_on,
-        })
+        all_results = []
+        for name, (future_off, future_on) in futures.items():
+            info = TEST_IMAGES[name]
+            all_results.append({
+                "name": name,
+                "category": info["category"],
+                "description": info["description"],
+                "prompt": info["prompt"],
+                "code_off": future_off.result(),
+                "code_on": future_on.result(),
+            })
 
     # Step 3: Save results
     print("\n" + "=" * 60)
@@ -248,8 +192,11 @@ def main():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     results_file = RAW_DIR / f"quick_test_{timestamp}.json"
 
-    with open(results_file, "w") as f:
-        json.dump(all_results, f, indent=2)
+    if orjson:
+        results_file.write_bytes(orjson.dumps(all_results, option=orjson.OPT_INDENT_2))
+    else:
+        with open(results_file, "w") as f:
+            json.dump(all_results, f, indent=2)
 
     print(f"Results saved to: {results_file}")
 
@@ -5,15 +5,22 @@ Usage:
     python run_experiment.py              # Run all tests
     python run_experiment.py --test 1     # Run specific test
     python run_experiment.py --baseline   # Run baseline only (code exec OFF)
+    python run_experiment.py --workers 4  # Limit concurrent API requests
 """
 
 import argparse
 import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
-from gemini_client import run_vision_query, test_connection
+from gemini_client import list_input_files, run_vision_query, test_connection
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Paths
 EXPERIMENT_DIR = Path(__file__).parent.parent
@@ -26,6 +33,11 @@ SCREENSHOTS_DIR = OUTPUTS_DIR / "screenshots"
 RAW_DIR.mkdir(parents=True, exist_ok=True)
 SCREENSHOTS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Console banners and per-mode names, indexed by the code_execution flag
+_BAR60 = "=" * 60
+_HASH60 = "#" * 60
+_MODE_NAMES = ("code_off", "code_on")
+
 
 # Test definitions
 TESTS = {
@@ -81,72 +93,83 @@ TESTS = {
 }
 
 
-def run_single_test(test_id: int, code_execution: bool) -> dict:
+def run_single_test(test_id: int, code_execution: bool, available: set[str], workers: int = 8) -> dict:
     """Run a single test with specified code execution setting."""
     test = TESTS[test_id]
-    mode = "code_on" if code_execution else "code_off"
+    mode = _MODE_NAMES[code_execution]
 
-    print(f"\n{'='*60}")
+    print(f"\n{_BAR60}")
     print(f"Test {test_id}: {test['name']} (code_execution={code_execution})")
-    print(f"{'='*60}")
-
-    results = []
+    print(_BAR60)
+
+    # Each image is an independent API round-trip, so run them concurrently
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for i, image_file in enumerate(test["images"]):
+            if image_file in available:
+                futures[i] = executor.submit(
+                    run_vision_query,
+                    image_path=INPUTS_DIR / image_file,
+                    prompt=test["prompt"],
+                    code_execution=code_execution,
+                )
+        print(f"  Running {len(futures)} images ({workers} at a time)...")
+
+    # One slot per image, filled by index in either branch below
+    results = [None] * len(test["images"])
 
     for i, image_file in enumerate(test["images"]):
-        image_path = INPUTS_DIR / image_file
-
-        if not image_path.exists():
+        if i not in futures:
             print(f"  ⚠ Skipping {image_file} - file not found")
-            results.append({
+            results[i] = {
                 "image": image_file,
                 "status": "skipped",
                 "reason": "file not found"
-            })
+            }
             continue
 
-        print(f"  Running: {image_file}...")
-
-        response = run_vision_query(
-            image_path=str(image_path),
-            prompt=test["prompt"],
-            code_execution=code_execution,
-        )
+        print(f"  {image_file}:")
+        response = futures[i].result()
 
         # Check ground truth if available
         ground_truth = None
         if test["ground_truth"] and i < len(test["ground_truth"]):
             ground_truth = test["ground_truth"][i]
 
+        success = response["success"]
+        text = response.get("text", "")
+        code_executed = response.get("code_executed", [])
+        images_generated = response.get("images_generated", [])
+        error = response.get("error")
+
         result = {
             "image": image_file,
-            "status": "success" if response["success"] else "error",
-            "response_text": response.get("text", ""),
-            "code_executed": response.get("code_executed", []),
+            "status": "success" if success else "error",
+            "response_text": text,
+            "code_executed": code_executed,
             "code_results": response.get("code_results", []),
-            "images_generated": len(response.get("images_generated", [])),
+            "images_generated": len(images_generated),
             "ground_truth": ground_truth,
-            "error": response.get("error"),
+            "error": error,
         }
 
-        results.append(result)
+        results[i] = result
 
         # Save any generated images
-        for j, img_data in enumerate(response.get("images_generated", [])):
-            import base64
-            img_bytes = base64.b64decode(img_data["data"])
-            img_path = SCREENSHOTS_DIR / f"{test['name']}_{image_file}_{mode}_{j}.png"
-            with open(img_path, "wb") as f:
-                f.write(img_bytes)
+        for j, img_data in enumerate(images_generated):
+            img_path = Path(img_data["path"]).replace(
+                SCREENSHOTS_DIR / f"{test['name']}_{image_file}_{mode}_{j}.png"
+            )
             print(f"    Saved annotated image: {img_path.name}")
 
         # Print summary
-        if response["success"]:
-            text_preview = response["text"][:100].replace("\n", " ")
+        if success:
+            text_preview = text[:100].replace("\n", " ")
             print(f"    ✓ Response: {text_preview}...")
-            if response["code_executed"]:
-                print(f"    ✓ Code executed: {len(response['code_executed'])} blocks")
+            if code_executed:
+                print(f"    ✓ Code executed: {len(code_executed)} blocks")
         else:
-            print(f"    ✗ Error: {response.get('error', 'Unknown')}")
+            print(f"    ✗ Error: {error or 'Unknown'}")
 
     return {
         "test_id": test_id,
@@ -156,12 +179,13 @@ def run_single_test(test_id: int, code_execution: bool) -> dict:
     }
 
 
-def save_results(all_results: list, filename: str):
-    """Save results to JSON file."""
-    output_path = RAW_DIR / filename
-    with open(output_path, "w") as f:
-        json.dump(all_results, f, indent=2)
-    print(f"\nResults saved to: {output_path}")
+def append_result(f, result: dict):
+    """Append one test result as a JSON line and flush it, so finished tests survive a crash."""
+    if orjson:
+        f.write(orjson.dumps(result) + b"\n")
+    else:
+        f.write(json.dumps(result, separators=(",", ":")).encode() + b"\n")
+    f.flush()
 
 
 def main():
@@ -169,7 +193,10 @@ def main():
     parser.add_argument("--test", type=int, help="Run specific test (1-7)")
     parser.add_argument("--baseline", action="store_true", help="Run baseline only (code exec OFF)")
     parser.add_argument("--treatment", action="store_true", help="Run treatment only (code exec ON)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent API requests per test (default: 8)")
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
 
     # Test API connection first
     print("Testing API connection...")
@@ -190,33 +217,35 @@ def main():
     else:
         modes = [False, True]  # both
 
-    all_results = []
+    available = list_input_files(INPUTS_DIR)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_path = RAW_DIR / f"experiment_results_{timestamp}.jsonl"
 
-    for code_exec in modes:
-        mode_name = "code_on" if code_exec else "code_off"
-        print(f"\n{'#'*60}")
-        print(f"# Running: {mode_name.upper()}")
-        print(f"{'#'*60}")
+    # Stream each test's result to disk as it completes (JSON Lines)
+    with open(output_path, "ab") as f:
+        for code_exec in modes:
+            mode_name = _MODE_NAMES[code_exec]
+            print(f"\n{_HASH60}")
+            print(f"# Running: {mode_name.upper()}")
+            print(_HASH60)
 
-        for test_id in test_ids:
-            if test_id not in TESTS:
-                print(f"Unknown test ID: {test_id}")
-                continue
+            for test_id in test_ids:
+                if test_id not in TESTS:
+                    print(f"Unknown test ID: {test_id}")
+                    continue
 
-            result = run_single_test(test_id, code_exec)
-            all_results.append(result)
+                result = run_single_test(test_id, code_exec, available, args.workers)
+                append_result(f, result)
 
-    # Save all results
-    save_results(all_results, f"experiment_results_{timestamp}.json")
+    print(f"\nResults saved to: {output_path}")
 
     # Print summary
-    print("\n" + "="*60)
+    print(f"\n{_BAR60}")
     print("EXPERIMENT COMPLETE")
-    print("="*60)
+    print(_BAR60)
     print(f"Tests run: {len(test_ids)}")
-    print(f"Modes: {['code_off', 'code_on'] if len(modes) == 2 else modes}")
-    print(f"Results saved to: outputs/raw/experiment_results_{timestamp}.json")
+    print(f"Modes: {[_MODE_NAMES[m] for m in modes]}")
+    print(f"Results saved to: outputs/raw/{output_path.name}")
     print("\nNext: Run compare_results.py to generate comparison report")
 
 
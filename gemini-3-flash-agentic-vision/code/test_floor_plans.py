@@ -3,15 +3,20 @@ Test floor plan images for trees/doors counting and fittings counting.
 Run after saving images to inputs/ folder.
 """
 
-import os
 import json
 import base64
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from dotenv import load_dotenv
-from google import genai
 from google.genai import types
 
+from gemini_client import MODEL, get_client, list_input_files
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Setup paths
 EXPERIMENT_DIR = Path(__file__).parent.parent
 INPUTS_DIR = EXPERIMENT_DIR / "inputs"
@@ -19,12 +24,7 @@ OUTPUTS_DIR = EXPERIMENT_DIR / "outputs"
 RAW_DIR = OUTPUTS_DIR / "raw"
 SCREENSHOTS_DIR = OUTPUTS_DIR / "screenshots"
 
-# Load environment
-load_dotenv(EXPERIMENT_DIR / ".env")
-
-# Initialize Gemini client
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
-MODEL = "gemini-3-flash-preview"
+_MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
 
 # New test images
 FLOOR_PLAN_TESTS = {
@@ -41,21 +41,19 @@ FLOOR_PLAN_TESTS = {
 }
 
 
-def load_image_as_part(image_path: Path) -> types.Part:
-    """Load image file as Gemini Part."""
-    with open(image_path, "rb") as f:
-        image_data = f.read()
+def load_image_as_part(image_path: Path, image_data: bytes | None = None) -> types.Part:
+    """Load image file as Gemini Part, reusing image_data if it was already read."""
+    if image_data is None:
+        image_data = image_path.read_bytes()
 
-    suffix = image_path.suffix.lower()
-    mime_types = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
-    mime_type = mime_types.get(suffix, "image/png")
+    mime_type = _MIME_TYPES.get(image_path.suffix.lower(), "image/png")
 
     return types.Part.from_bytes(data=image_data, mime_type=mime_type)
 
 
-def run_vision_query(image_path: Path, prompt: str, code_execution: bool) -> dict:
+def run_vision_query(image_path: Path, prompt: str, code_execution: bool, image_data: bytes | None = None) -> dict:
     """Run a vision query with optional code execution."""
-    image = load_image_as_part(image_path)
+    image = load_image_as_part(image_path, image_data)
 
     tools = []
     if code_execution:
@@ -64,39 +62,44 @@ def run_vision_query(image_path: Path, prompt: str, code_execution: bool) -> dic
     config = types.GenerateContentConfig(tools=tools)
 
     try:
-        response = client.models.generate_content(
+        response = get_client().models.generate_content(
             model=MODEL,
             contents=[image, prompt],
             config=config,
         )
 
-        result = {
-            "success": True,
-            "text": "",
-            "code_executed": [],
-            "code_results": [],
-            "images_generated_count": 0,
-            "images_generated": [],  # Will truncate base64 for display
-        }
-
+        # Accumulate into locals and build the result dict once at the end
+        texts = []
+        codes = []
+        code_results = []
+        images = []  # Truncated base64 previews for display
         for candidate in response.candidates:
             for part in candidate.content.parts:
-                if hasattr(part, "text") and part.text:
-                    result["text"] += part.text
-                if hasattr(part, "executable_code") and part.executable_code:
-                    result["code_executed"].append(part.executable_code.code)
-                if hasattr(part, "code_execution_result") and part.code_execution_result:
-                    result["code_results"].append(part.code_execution_result.output)
-                if hasattr(part, "inline_data") and part.inline_data:
-                    result["images_generated_count"] += 1
-                    # Store truncated version for display
-                    b64_preview = base64.b64encode(part.inline_data.data).decode()[:100]
-                    result["images_generated"].append({
-                        "mime_type": part.inline_data.mime_type,
+                # A Part carries a single payload, so stop at the first one set
+                if text := getattr(part, "text", None):
+                    texts.append(text)
+                elif code := getattr(part, "executable_code", None):
+                    codes.append(code.code)
+                elif code_result := getattr(part, "code_execution_result", None):
+                    code_results.append(code_result.output)
+                elif inline_data := getattr(part, "inline_data", None):
+                    # Store truncated version for display; 75 bytes encode to exactly 100 chars
+                    b64_preview = base64.b64encode(inline_data.data[:75]).decode()
+                    images.append({
+                        "mime_type": inline_data.mime_type,
                         "data_preview": f"{b64_preview}... <truncated>"
                     })
                     # Save actual image
-                    save_generated_image(part.inline_data, image_path.stem, code_execution, result["images_generated_count"])
+                    save_generated_image(inline_data, image_path.stem, code_execution, len(images))
+
+        result = {
+            "success": True,
+            "text": "".join(texts),
+            "code_executed": codes,
+            "code_results": code_results,
+            "images_generated_count": len(images),
+            "images_generated": images,
+        }
 
         return result
 
@@ -108,20 +111,31 @@ def save_generated_image(inline_data, test_name: str, code_execution: bool, inde
     """Save generated image to screenshots folder."""
     mode = "code_ON" if code_execution else "code_OFF"
     img_path = SCREENSHOTS_DIR / f"{test_name}_{mode}_{index}.png"
-    with open(img_path, "wb") as f:
-        f.write(inline_data.data)
+    img_path.write_bytes(inline_data.data)
     print(f"    Saved: {img_path.name}")
 
 
+def _truncate(s: str, limit: int) -> str:
+    """Cut s to limit characters, marking the cut with an ellipsis."""
+    return s if len(s) <= limit else s[:limit] + "..."
+
+
 def format_json_for_blog(result: dict, truncate_code: bool = True) -> str:
     """Format result as JSON suitable for blog display."""
+    text = result.get("text", "")
+    code_executed = result.get("code_executed", [])
+    if truncate_code:
+        code_executed = [_truncate(c, 200) for c in code_executed]
+
     display = {
         "success": result.get("success"),
-        "text": result.get("text", "")[:500] + "..." if len(result.get("text", "")) > 500 else result.get("text", ""),
-        "code_executed": [c[:200] + "..." if len(c) > 200 else c for c in result.get("code_executed", [])] if truncate_code else result.get("code_executed", []),
+        "text": _truncate(text, 500),
+        "code_executed": code_executed,
         "code_results": result.get("code_results", [])[:2],  # First 2 results
         "images_generated_count": result.get("images_generated_count", 0),
     }
+    if orjson:
+        return orjson.dumps(display, option=orjson.OPT_INDENT_2).decode()
     return json.dumps(display, indent=2)
 
 
@@ -133,11 +147,11 @@ def main():
     print()
 
     # Check which images exist
+    available = list_input_files(INPUTS_DIR)
     available_tests = {}
     for name, info in FLOOR_PLAN_TESTS.items():
-        path = INPUTS_DIR / info["file"]
-        if path.exists():
-            available_tests[name] = {"path": path, **info}
+        if info["file"] in available:
+            available_tests[name] = {"path": INPUTS_DIR / info["file"], **info}
             print(f"✓ Found: {info['file']}")
         else:
             print(f"✗ Missing: {info['file']} - please save to inputs/")
@@ -148,10 +162,16 @@ def main():
         print(f"  {INPUTS_DIR}/fittings.png")
         return
 
+    # Read every image up front in parallel, so each is read once and the
+    # reads overlap instead of each one stalling ahead of its API call
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        prefetched = {name: executor.submit(info["path"].read_bytes) for name, info in available_tests.items()}
+
     print()
     all_results = []
 
     for name, info in available_tests.items():
+        image_data = prefetched[name].result()
         print("=" * 50)
         print(f"Test: {name}")
         print(f"Description: {info['description']}")
@@ -159,7 +179,7 @@ def main():
 
         # Code OFF
         print("\n[Code OFF]")
-        result_off = run_vision_query(info["path"], info["prompt"], code_execution=False)
+        result_off = run_vision_query(info["path"], info["prompt"], code_execution=False, image_data=image_data)
         if result_off.get("success"):
             print(f"Response: {result_off['text'][:200]}...")
         else:
@@ -167,7 +187,7 @@ def main():
 
         # Code ON
         print("\n[Code ON]")
-        result_on = run_vision_query(info["path"], info["prompt"], code_execution=True)
+        result_on = run_vision_query(info["path"], info["prompt"], code_execution=True, image_data=image_data)
         if result_on.get("success"):
             print(f"Response: {result_on['text'][:200]}...")
             print(f"Code blocks executed: {len(result_on.get('code_executed', []))}")
@@ -190,8 +210,11 @@ def main():
     # Save results
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     results_file = RAW_DIR / f"floor_plan_tests_{timestamp}.json"
-    with open(results_file, "w") as f:
-        json.dump(all_results, f, indent=2, default=str)
+    if orjson:
+        results_file.write_bytes(orjson.dumps(all_results, option=orjson.OPT_INDENT_2, default=str))
+    else:
+        with open(results_file, "w") as f:
+            json.dump(all_results, f, indent=2, default=str)
     print(f"\nResults saved to: {results_file}")
 
 